@@ -1,21 +1,27 @@
 import uuid
 import streamlit as st
 from pydantic import BaseModel, Field
-from typing import List, Annotated, Any
+from typing import List, Annotated, Any, Literal
 from langchain_openai import ChatOpenAI
 from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph import StateGraph, MessagesState, START, END
-from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
 from langgraph.prebuilt import ToolNode
 from langgraph.types import Command
 try:
-    from utils.tools import tsp_solver
+    from utils.tools import tsp_solver, bin_packing_solver
+    from utils.context_helper import build_context
+    from utils.router_helper import route_request
 except:
-    from agent.utils.tools import tsp_solver
+    from agent.utils.tools import tsp_solver, bin_packing_solver
+    from agent.utils.context_helper import build_context
+    from agent.utils.router_helper import route_request
 
 MODEL = st.secrets.get("OPENAI_MODEL")
 API_KEY = st.secrets.get("OPENAI_KEY")
 MODEL = ChatOpenAI(model=MODEL, api_key=API_KEY, temperature=0)
+# Approximate token budget for the prompt sent on each assistant turn
+CONTEXT_TOKEN_BUDGET = int(st.secrets.get("CONTEXT_TOKEN_BUDGET", 4000))
 
 class State(MessagesState):
     """Conversation state for the optimizer assistant."""
@@ -29,6 +35,9 @@ Available tools:
 - tsp_solver: Call this tool when the problem can be modeled as a 
   Traveling Salesperson Problem (TSP). The tool will gather all necessary 
   information internally. 
+- bin_packing_solver: Call this tool when the problem consists of loading 
+  pallets into a container. The tool will gather all necessary 
+  information internally.
 
 Core Instructions:
 
@@ -48,11 +57,27 @@ IMPORTANT:
     - Your goal is identified which is the necessary tool that solves the user problem.
     - Do not include any file or sourde path in your response
 """
+def router(state: State) -> Command[Literal["assistant", "tools"]]:
+    """Pre-router node: dispatches well-formed solver requests straight to the tools, skipping the LLM."""
+    last_message = state["messages"][-1]
+    routed = route_request(last_message.content) if isinstance(last_message, HumanMessage) else None
+    if routed is None:
+        return Command(goto="assistant")
+
+    tool_name, tool_args = routed
+    tool_call = {"name": tool_name,
+                 "args": tool_args,
+                 "id": f"call_{uuid.uuid4().hex[:24]}",
+                 "type": "tool_call"}
+    return Command(goto="tools",
+                   update={"messages": [AIMessage(content="", tool_calls=[tool_call])]})
+
 def assistant(state:State):    
-    """Main assistant node: combines system message with conversation history."""
-    response = MODEL_WITH_TOOLS.invoke(
-            [SystemMessage(content=MODEL_SYSTEM_MESSAGE)]+state["messages"]
-        )
+    """Main assistant node: combines system message with a bounded conversation history."""
+    context = build_context(MODEL_SYSTEM_MESSAGE,
+                            state["messages"],
+                            max_tokens=CONTEXT_TOKEN_BUDGET)
+    response = MODEL_WITH_TOOLS.invoke(context)
     return {"messages": response}
 
 def should_continue(state: State):
@@ -90,17 +115,18 @@ def invoke(message, thread_id="1"):
     return response, interruption
 
 
-tools = [tsp_solver]
+tools = [tsp_solver, bin_packing_solver]
 MODEL_WITH_TOOLS = MODEL.bind_tools(tools)
 tool_node = ToolNode(tools)
 
 # Define the graph
 builder = StateGraph(State)
+builder.add_node("router", router)
 builder.add_node("assistant", assistant)
 builder.add_node("tools", tool_node)
 
 
-builder.add_edge(START, "assistant")
+builder.add_edge(START, "router")
 builder.add_conditional_edges("assistant", should_continue,{"tools": "tools", "end": END}
 )
 
@@ -0,0 +1,44 @@
+import os
+from datetime import datetime
+import numpy as np
+
+# Folder where solver outputs (maps, arrays) are written
+ARTIFACTS_DIR = "out"
+
+
+def artifact_path(prefix, extension, folder=ARTIFACTS_DIR):
+    """
+    Returns a unique, timestamped path for a new artifact.
+
+    Args:
+        prefix (str): File name prefix, e.g. "tsp_route".
+        extension (str): File extension without the dot.
+        folder (str): Output folder, created when missing.
+
+    Returns:
+        str: Path like "out/tsp_route_2025_01_31_12_00_00_000.npz".
+    """
+    os.makedirs(folder, exist_ok=True)
+    now_str = datetime.now().strftime("%Y_%m_%d_%H_%M_%S_%f")[:-3]
+    return os.path.join(folder, f"{prefix}_{now_str}.{extension}")
+
+
+def save_artifact(prefix, folder=ARTIFACTS_DIR, **arrays):
+    """
+    Stores solution arrays in a compressed .npz file.
+
+    Only the returned path (a handle) and a short summary should be kept in
+    the graph state, so checkpoints stay small whatever the plan size.
+
+    Args:
+        prefix (str): File name prefix.
+        folder (str): Output folder.
+        **arrays: Arrays to store, by name.
+
+    Returns:
+        str: Path of the written file.
+    """
+    path = artifact_path(prefix, "npz", folder)
+    np.savez_compressed(path, **arrays)
+    return path
+
@@ -1,3 +1,4 @@
+import numpy as np
 import matplotlib.pyplot as plt
 from rectpack import newPacker
 
@@ -43,12 +44,26 @@ def solve_bin_packing(pallets, bins):
     all_rects = pack.rect_list()
     all_pals = [sorted([p[3], p[4]]) for p in all_rects]
 
-    # Print summary
+    # Build summary
+    summary = []
     for pallet, qty in pallets:
         count = all_pals.count(sorted(pallet))
-        print(f"{count}/{qty} Pallets {pallet[0]}x{pallet[1]} cm")
+        summary.append(f"{count}/{qty} Pallets {pallet[0]}x{pallet[1]} cm")
 
-    return all_rects, all_pals
+    return all_rects, all_pals, summary
+
+
+def rectangles_to_array(all_rects):
+    """
+    Packs the solver output into a compact (n, 5) int32 array.
+
+    Columns are (bin, x, y, width, height); the rectangle id is dropped
+    since pallets are added without one.
+    """
+    rects = np.zeros((len(all_rects), 5), dtype=np.int32)
+    for i, (b, x, y, w, h, _) in enumerate(all_rects):
+        rects[i] = (b, x, y, w, h)
+    return rects
 
 
 # -------------------------------
@@ -112,7 +127,8 @@ if __name__ == "__main__":
     pallets = [(pal1, 8), (pal2, 6)]
 
     # resolver
-    all_rects, all_pals = solver(pallets, my_container)
+    all_rects, all_pals, summary = solve_bin_packing(pallets, my_container)
+    print("\n".join(summary))
 
     # graficar
     plot_solution(all_rects, pallets, my_container[0])
\ No newline at end of file
@@ -0,0 +1,198 @@
+import ast
+from langchain_core.messages import (AIMessage, HumanMessage, SystemMessage,
+                                     ToolMessage)
+
+# Rough chars-per-token ratio used to estimate prompt size without a tokenizer
+CHARS_PER_TOKEN = 4
+# Plain-text tool results longer than this (in chars) are cut to their head
+MAX_TOOL_CONTENT_CHARS = 600
+# Characters kept from each dropped human turn in the summary
+SUMMARY_CHARS_PER_TURN = 160
+
+
+# -------------------------------
+# Token estimation
+# -------------------------------
+def _content_to_text(content):
+    """Return message content as plain text (content may be str, list or dict)."""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        parts = []
+        for part in content:
+            if isinstance(part, dict) and "text" in part:
+                parts.append(str(part["text"]))
+            else:
+                parts.append(str(part))
+        return " ".join(parts)
+    return str(content)
+
+
+def estimate_tokens(message):
+    """Approximate the number of tokens a message adds to the prompt."""
+    text = _content_to_text(message.content)
+    tokens = len(text) // CHARS_PER_TOKEN + 4  # per-message overhead
+    tool_calls = getattr(message, "tool_calls", None) or []
+    for tool_call in tool_calls:
+        tokens += len(str(tool_call.get("args", ""))) // CHARS_PER_TOKEN + 8
+    return tokens
+
+
+# -------------------------------
+# Tool payload compaction
+# -------------------------------
+def _tool_payload(content):
+    """Return a tool result as a dict ({"optimal_route": ..., "route_path": ...}), or None."""
+    if isinstance(content, dict):
+        return content
+    if isinstance(content, str) and content.startswith("{"):
+        try:
+            payload = ast.literal_eval(content)
+        except (ValueError, SyntaxError):
+            return None
+        return payload if isinstance(payload, dict) else None
+    return None
+
+
+def _cap_text(text, max_chars, what):
+    """Cut text to its first max_chars characters, noting how much was omitted."""
+    if len(text) <= max_chars:
+        return text
+    return f"{text[:max_chars]}...\n[{len(text) - max_chars} chars of {what} omitted]"
+
+
+def compact_tool_message(message):
+    """
+    Replace the payload of a ToolMessage from an earlier turn with a compact
+    reference to the stored solution.
+
+    Solver payloads keep their summary lines and artifact handles
+    (route_path, rectangles_path); per-stop listings ("- ..." lines) are
+    dropped since the full solution is stored in the artifact. Other long
+    results are cut to their head.
+    """
+    payload = _tool_payload(message.content)
+    if payload is None:
+        text = _content_to_text(message.content)
+        content = _cap_text(text, MAX_TOOL_CONTENT_CHARS, "an earlier tool result")
+    else:
+        lines = ["Earlier tool result (compacted):"]
+        for key, value in payload.items():
+            if key.endswith("_path"):
+                lines.append(f"{key}: {value}")
+                continue
+            value_lines = str(value).splitlines()
+            kept = [line for line in value_lines if not line.lstrip().startswith("- ")]
+            omitted = len(value_lines) - len(kept)
+            if omitted:
+                kept.append(f"[{omitted} listed items omitted, see the stored solution]")
+            lines.append(f"{key}: " + "\n".join(kept))
+        content = "\n".join(lines)
+
+    if content == message.content:
+        return message
+    return ToolMessage(content=content,
+                       tool_call_id=message.tool_call_id,
+                       name=message.name,
+                       id=message.id)
+
+
+# -------------------------------
+# Turn grouping & summarisation
+# -------------------------------
+def _split_turns(messages):
+    """
+    Group messages into turns, each starting at a HumanMessage.
+
+    Keeping whole turns guarantees an AIMessage with tool calls is never
+    separated from its ToolMessages, which the OpenAI API rejects.
+    """
+    turns = []
+    for message in messages:
+        if isinstance(message, HumanMessage) or not turns:
+            turns.append([message])
+        else:
+            turns[-1].append(message)
+    return turns
+
+
+def summarize_turns(turns):
+    """Build a short extractive summary of the dropped turns."""
+    lines = []
+    for turn in turns:
+        for message in turn:
+            text = " ".join(_content_to_text(message.content).split())
+            if isinstance(message, HumanMessage):
+                lines.append(f"- User: {text[:SUMMARY_CHARS_PER_TURN]}")
+            elif isinstance(message, AIMessage) and message.tool_calls:
+                names = ", ".join(tc["name"] for tc in message.tool_calls)
+                lines.append(f"- Assistant called: {names}")
+    return "Summary of earlier conversation:\n" + "\n".join(lines)
+
+
+def _cap_latest_turn(turn, budget):
+    """Cut the user message of the latest turn so the turn fits in budget tokens."""
+    human = turn[0]
+    cost = sum(estimate_tokens(m) for m in turn)
+    if not isinstance(human, HumanMessage) or cost <= budget:
+        return turn
+    others = cost - estimate_tokens(human)
+    # Leave room for the message overhead and the "chars omitted" note
+    max_chars = max((budget - others - 4) * CHARS_PER_TOKEN - 64, 0)
+    text = _content_to_text(human.content)
+    capped = HumanMessage(content=_cap_text(text, max_chars, "this message"), id=human.id)
+    return [capped] + turn[1:]
+
+
+# -------------------------------
+# Context builder
+# -------------------------------
+def build_context(system_message, messages, max_tokens=4000):
+    """
+    Build the prompt sent to the LLM on each assistant turn.
+
+    Args:
+        system_message (str): System prompt, always kept.
+        messages (list): Full conversation history from the graph state.
+        max_tokens (int): Approximate token budget for the whole prompt.
+
+    Returns:
+        list: Messages that fit in the budget. Old turns are dropped oldest
+        first and replaced by a short summary; the latest turn is always kept,
+        with its tool results intact since the assistant reports on them now.
+        When the latest turn alone exceeds the budget, its user message is
+        cut to fit; the tool results it holds are the only content that may
+        still go over.
+    """
+    system = SystemMessage(content=system_message)
+    turns = _split_turns(messages)
+    if not turns:
+        return [system]
+    budget = max_tokens - estimate_tokens(system)
+    turns = [[compact_tool_message(m) if isinstance(m, ToolMessage) else m for m in turn]
+             for turn in turns[:-1]] + [_cap_latest_turn(turns[-1], budget)]
+
+    kept = []
+    for turn in reversed(turns):
+        cost = sum(estimate_tokens(m) for m in turn)
+        if kept and cost > budget:
+            break
+        kept.insert(0, turn)
+        budget -= cost
+
+    dropped = turns[:len(turns) - len(kept)]
+    prompt = [system]
+    if dropped:
+        # Drop the oldest summary lines until the summary fits what is left
+        summary = summarize_turns(dropped)
+        max_chars = max(budget, 0) * CHARS_PER_TOKEN
+        header, *lines = summary.split("\n")
+        while lines and len(summary) > max_chars:
+            lines.pop(0)
+            summary = "\n".join([header] + lines)
+        if lines:
+            prompt.append(SystemMessage(content=summary))
+
+    for turn in kept:
+        prompt.extend(turn)
+    return prompt
@@ -0,0 +1,89 @@
+import os
+import sqlite3
+
+# Default on-disk cache, shared by the app and by batch workers
+DEFAULT_CACHE_PATH = "out/distance_cache.sqlite"
+# Max number of SQL parameters per query (SQLite default limit is 999)
+QUERY_CHUNK = 900
+
+
+def location_key(location):
+    """Returns the cache key of a (lat, lon) pair (6 decimals, ~0.1 m)."""
+    return f"{float(location[0]):.6f},{float(location[1]):.6f}"
+
+
+class DistanceCache:
+    """
+    SQLite backed cache of driving distances and durations between two
+    locations, per departure slot keyed by its minutes since Monday 00:00
+    (see travel_time.slot_key).
+
+    SQLite handles locking between processes, so a single cache file can be
+    shared by every worker of a batch run. Connections are opened lazily per
+    process, which keeps instances picklable.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH):
+        self.path = path
+        self._connection = None
+        self._pid = None
+
+    def __getstate__(self):
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"])
+
+    @property
+    def connection(self):
+        if self._connection is None or self._pid != os.getpid():
+            folder = os.path.dirname(self.path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            self._connection = sqlite3.connect(self.path, timeout=30)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS slot_travel_times ("
+                "origin TEXT, destination TEXT, slot INTEGER, "
+                "distance INTEGER, duration INTEGER, "
+                "PRIMARY KEY (origin, destination, slot))")
+            self._pid = os.getpid()
+        return self._connection
+
+    def get_many(self, origins, slot):
+        """
+        Returns every cached travel time starting at the given origins.
+
+        Args:
+            origins (list[str]): Origin keys (see location_key).
+            slot (int): Departure slot key (see travel_time.slot_key).
+
+        Returns:
+            dict[tuple[str, str], tuple[int, int]]: (meters, seconds) by
+            (origin, destination).
+        """
+        origins = list(set(origins))
+        found = {}
+        for start in range(0, len(origins), QUERY_CHUNK):
+            chunk = origins[start:start + QUERY_CHUNK]
+            rows = self.connection.execute(
+                "SELECT origin, destination, distance, duration FROM slot_travel_times "
+                f"WHERE slot = ? AND origin IN ({','.join('?' * len(chunk))})", [slot] + chunk)
+            for origin, destination, distance, duration in rows:
+                found[(origin, destination)] = (distance, duration)
+        return found
+
+    def set_many(self, travel_times, slot):
+        """
+        Stores travel times.
+
+        Args:
+            travel_times (dict[tuple[str, str], tuple[int, int]]): (meters,
+                seconds) by (origin, destination).
+            slot (int): Departure slot key (see travel_time.slot_key).
+        """
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO slot_travel_times VALUES (?, ?, ?, ?, ?)",
+                [(o, d, slot, distance, duration)
+                 for (o, d), (distance, duration) in travel_times.items()])
@@ -0,0 +1,128 @@
+import re
+
+# "(19.4326, -99.1332)" or "19.4326,-99.1332" — decimals required so that
+# plain integers such as pallet sizes are never mistaken for coordinates
+COORDINATE_PATTERN = re.compile(
+    r"\(?\s*(-?\d{1,2}\.\d+)\s*,\s*(-?\d{1,3}\.\d+)\s*\)?")
+# "10 pallets 80x120" / "10 pallets of 80 x 120"
+PALLET_PATTERN = re.compile(
+    r"(\d+)\s*pallets?\s*(?:of\s*)?(\d+(?:\.\d+)?)\s*[x×*]\s*(\d+(?:\.\d+)?)",
+    re.IGNORECASE)
+# "into 235x590" / "container 235x590" / "in a 235 x 590"
+CONTAINER_PATTERN = re.compile(
+    r"(?:into|in|container)\s*(?:an?\s*|of\s*)?(\d+(?:\.\d+)?)\s*[x×*]\s*(\d+(?:\.\d+)?)",
+    re.IGNORECASE)
+# "buffer 5" / "buffer of 5 cm"
+BUFFER_PATTERN = re.compile(r"buffer\s*(?:of\s*)?(\d+(?:\.\d+)?)", re.IGNORECASE)
+# Separators allowed between the parsed parts of a message
+LEFTOVER_SPLIT = re.compile(r"[\s,;:()\[\]]+")
+# Words that may surround a bare coordinate list or packing spec; anything
+# else (a question, a sentence) means the message is for the LLM
+LOCATION_WORDS = {"origin", "start", "depot", "from", "to", "then", "and",
+                  "stop", "stops", "location", "locations", "coordinates",
+                  "visit", "route", "-"}
+PACKING_WORDS = {"a", "an", "and", "plus", "with", "cm", "pack", "load", "-"}
+
+
+def _integer(value):
+    """Return value as int, or None when it has a fractional part."""
+    value = float(value)
+    return int(value) if value.is_integer() else None
+
+
+# -------------------------------
+# Parsers
+# -------------------------------
+def parse_locations(text):
+    """
+    Extracts a list of (lat, lon) coordinates from free text.
+
+    Args:
+        text (str): User message.
+
+    Returns:
+        list[tuple[float, float]] | None: Coordinates in the given order (the
+        first one is the origin), or None when fewer than two are found.
+    """
+    locations = []
+    for lat, lon in COORDINATE_PATTERN.findall(text):
+        lat, lon = float(lat), float(lon)
+        if -90 <= lat <= 90 and -180 <= lon <= 180:
+            locations.append((lat, lon))
+    if len(locations) < 2:
+        return None
+    return locations
+
+
+def parse_packing_request(text):
+    """
+    Extracts pallets and container size from free text such as
+    "10 pallets 80x120, 5 pallets 100x120 into 235x590".
+
+    Args:
+        text (str): User message.
+
+    Returns:
+        dict | None: {"pallets": [(width, height, quantity), ...],
+        "container": (width, height), "buffer": int}, or None when the
+        pallets or the container cannot be identified, or when a size is
+        not a whole number (the solver only takes integers).
+    """
+    pallets = [(_integer(w), _integer(h), int(qty))
+               for qty, w, h in PALLET_PATTERN.findall(text)]
+    container = CONTAINER_PATTERN.search(text)
+    if not pallets or container is None:
+        return None
+
+    buffer = BUFFER_PATTERN.search(text)
+    container = (_integer(container.group(1)), _integer(container.group(2)))
+    buffer = _integer(buffer.group(1)) if buffer else 0
+    if None in container or buffer is None or any(None in pallet for pallet in pallets):
+        return None
+    return {"pallets": pallets, "container": container, "buffer": buffer}
+
+
+def _only_contains(text, patterns, allowed_words):
+    """True when text is made only of pattern matches, separators and allowed words."""
+    for pattern in patterns:
+        text = pattern.sub(" ", text)
+    words = [w.lower().rstrip(".") for w in LEFTOVER_SPLIT.split(text) if w]
+    return all(w in allowed_words for w in words)
+
+
+def route_request(text, strict=True):
+    """
+    Maps a well-formed request directly to a tool call.
+
+    Args:
+        text (str): User message.
+        strict (bool): Only accept messages that are essentially a bare
+            coordinate list or packing spec, so questions that merely quote
+            coordinates are left to the LLM. Batch jobs, which are known to
+            be solver requests, pass False.
+
+    Returns:
+        tuple[str, dict] | None: (tool name, tool arguments), or None when the
+        message must be handled by the LLM.
+    """
+    if not isinstance(text, str):
+        return None
+
+    packing_request = parse_packing_request(text)
+    if packing_request is not None and (not strict or _only_contains(
+            text, (PALLET_PATTERN, CONTAINER_PATTERN, BUFFER_PATTERN), PACKING_WORDS)):
+        return "bin_packing_solver", {
+            "reasoning": "The request lists pallets and a container size, "
+                         "so it is a bin packing problem.",
+            **packing_request,
+        }
+
+    locations = parse_locations(text)
+    if locations is not None and (not strict or _only_contains(
+            text, (COORDINATE_PATTERN,), LOCATION_WORDS)):
+        return "tsp_solver", {
+            "reasoning": "The request lists an origin and locations to visit, "
+                         "so it is a Traveling Salesperson Problem.",
+            "locations": locations,
+        }
+    return None
@@ -0,0 +1,186 @@
+import numpy as np
+from pydantic import (BaseModel, ConfigDict, Field, ValidationError, field_validator,
+                      model_validator)
+try:
+    from utils.router_helper import parse_locations, parse_packing_request
+    from utils.bin_packing_helper import create_pallet, create_container
+except:
+    from agent.utils.router_helper import parse_locations, parse_packing_request
+    from agent.utils.bin_packing_helper import create_pallet, create_container
+
+# Coordinates closer than this many decimals (~0.1 m) are considered the same stop
+COORDINATE_DECIMALS = 6
+
+
+# User facing names of schema fields in error messages
+FIELD_LABELS = {"coords": "locations"}
+
+
+def validation_message(error):
+    """Returns a short, user facing message for a validation error."""
+    if not isinstance(error, ValidationError):
+        return str(error)
+    messages = []
+    for e in error.errors():
+        msg = e["msg"].removeprefix("Value error, ")
+        if e["loc"]:
+            field = ".".join(str(FIELD_LABELS.get(part, part)) for part in e["loc"])
+            msg = f"{field}: {msg}"
+        messages.append(msg)
+    return "; ".join(messages)
+
+
+# -------------------------------
+# Locations (TSP)
+# -------------------------------
+class LocationsInput(BaseModel):
+    """
+    Validated TSP stops stored as an (n, 2) float64 array of (lat, lon).
+
+    The first row is the origin. Duplicate coordinates are merged keeping
+    their first occurrence, so the origin always stays in row 0.
+    """
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    coords: np.ndarray
+
+    @field_validator("coords", mode="before")
+    @classmethod
+    def validate_coords(cls, value):
+        try:
+            coords = np.asarray(value, dtype=np.float64)
+        except (TypeError, ValueError):
+            raise ValueError("locations must be a list of (lat, lon) pairs")
+        if coords.ndim != 2 or coords.shape[1] != 2:
+            raise ValueError("locations must be a list of (lat, lon) pairs")
+        if not np.isfinite(coords).all():
+            raise ValueError("locations contain non numeric coordinates")
+        bad = (np.abs(coords[:, 0]) > 90) | (np.abs(coords[:, 1]) > 180)
+        if bad.any():
+            raise ValueError(f"coordinate out of range: {tuple(coords[bad.argmax()].tolist())}")
+
+        # Merge duplicates, keeping first occurrences in their original order
+        _, first = np.unique(coords.round(COORDINATE_DECIMALS), axis=0, return_index=True)
+        coords = coords[np.sort(first)]
+        if len(coords) < 2:
+            raise ValueError("at least an origin and one location to visit are required")
+        coords.setflags(write=False)
+        return coords
+
+    @classmethod
+    def from_value(cls, value):
+        """
+        Builds the schema from a tool argument or an interrupt answer.
+
+        Accepts free text, a list of (lat, lon) pairs, a list of
+        {"lat": .., "lon": ..} dicts or an (n, 2) array.
+        """
+        if isinstance(value, cls):
+            return value
+        if isinstance(value, str):
+            value = parse_locations(value)
+            if value is None:
+                raise ValueError("no coordinates found, use (lat, lon) pairs")
+        elif isinstance(value, (list, tuple)) and value and isinstance(value[0], dict):
+            value = [(v.get("lat"), v.get("lon", v.get("lng"))) for v in value]
+        return cls(coords=value)
+
+    def __len__(self):
+        return len(self.coords)
+
+    def to_list(self):
+        """Returns the stops as a list of (lat, lon) tuples."""
+        return [tuple(row) for row in self.coords.tolist()]
+
+
+# -------------------------------
+# Pallets & container (bin packing)
+# -------------------------------
+class PackingInput(BaseModel):
+    """
+    Validated bin packing request.
+
+    Pallet types are stored as a (k, 3) int64 array of (width, height,
+    quantity). Identical types, including rotated ones, are collapsed into
+    a single row with their quantities added.
+    """
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    pallets: np.ndarray
+    container: tuple[int, int]
+    buffer: int = Field(default=0, ge=0)
+
+    @field_validator("pallets", mode="before")
+    @classmethod
+    def validate_pallets(cls, value):
+        try:
+            pallets = np.asarray(value, dtype=np.float64)
+        except (TypeError, ValueError):
+            raise ValueError("pallets must be a list of (width, height, quantity)")
+        if pallets.ndim != 2 or pallets.shape[1] != 3 or len(pallets) == 0:
+            raise ValueError("pallets must be a list of (width, height, quantity)")
+        if not np.isfinite(pallets).all() or (pallets != np.round(pallets)).any():
+            raise ValueError("pallet dimensions and quantities must be integers")
+        pallets = pallets.astype(np.int64)
+        if (pallets <= 0).any():
+            raise ValueError("pallet dimensions and quantities must be positive")
+
+        # Collapse identical pallet types regardless of orientation
+        dims = np.sort(pallets[:, :2], axis=1)
+        types, first, inverse = np.unique(dims, axis=0, return_index=True, return_inverse=True)
+        quantities = np.bincount(inverse.ravel(), weights=pallets[:, 2]).astype(np.int64)
+        order = np.argsort(first)
+        pallets = np.column_stack([types[order], quantities[order]])
+        pallets.setflags(write=False)
+        return pallets
+
+    @field_validator("container")
+    @classmethod
+    def validate_container(cls, value):
+        if min(value) <= 0:
+            raise ValueError("container dimensions must be positive")
+        return value
+
+    @model_validator(mode="after")
+    def check_fit(self):
+        # A pallet that fits in no orientation would be silently dropped by the solver
+        dims = self.pallets[:, :2] + self.buffer
+        container = sorted(self.container)
+        too_big = (dims[:, 0] > container[0]) | (dims[:, 1] > container[1])
+        if too_big.any():
+            w, h = self.pallets[too_big.argmax(), :2]
+            raise ValueError(f"pallet {w}x{h} does not fit in container "
+                             f"{self.container[0]}x{self.container[1]}")
+        return self
+
+    @classmethod
+    def from_value(cls, value):
+        """
+        Builds the schema from a tool argument or an interrupt answer.
+
+        Accepts free text ("10 pallets 80x120 into 235x590") or a dict with
+        "pallets" as (width, height, quantity) rows, "container" and an
+        optional "buffer".
+        """
+        if isinstance(value, cls):
+            return value
+        if isinstance(value, str):
+            parsed = parse_packing_request(value)
+            if parsed is None:
+                raise ValueError("could not read pallets and container, "
+                                 "use e.g. '10 pallets 80x120 into 235x590'")
+            value = parsed
+        if not isinstance(value, dict):
+            raise ValueError("expected pallets and container, "
+                             "e.g. '10 pallets 80x120 into 235x590'")
+        return cls(**value)
+
+    @property
+    def total_pallets(self):
+        return int(self.pallets[:, 2].sum())
+
+    def to_solver_args(self):
+        """Returns (pallets, bins) in the format expected by solve_bin_packing."""
+        pallets = [(create_pallet(int(w), int(h), self.buffer), int(qty))
+                   for w, h, qty in self.pallets]
+        return pallets, create_container(*self.container)
@@ -1,16 +1,37 @@
+import numpy as np
 from datetime import datetime
-from typing import List, Annotated, Any, Tuple
+from typing import List, Annotated, Any, Tuple, Optional
 from langchain_core.tools import tool, InjectedToolCallId
 from langgraph.types import interrupt, Command
 from langchain_core.messages import ToolMessage
 try:
-    from utils.tsp_helper import get_distance_matrix, solve_tsp, show_tsp_route_on_map
+    from utils.tsp_helper import (get_travel_time_matrices, simulate_route, solve_tsp, route_distance,
+                                  show_tsp_route_on_map, DECOMPOSE_ABOVE)
+    from utils.bin_packing_helper import solve_bin_packing, rectangles_to_array
+    from utils.artifacts import artifact_path, save_artifact
+    from utils.distance_cache import DistanceCache
+    from utils.schemas import LocationsInput, PackingInput, validation_message
 except:
-    from agent.utils.tsp_helper import get_distance_matrix, solve_tsp, show_tsp_route_on_map
-    
+    from agent.utils.tsp_helper import (get_travel_time_matrices, simulate_route, solve_tsp, route_distance,
+                                        show_tsp_route_on_map, DECOMPOSE_ABOVE)
+    from agent.utils.bin_packing_helper import solve_bin_packing, rectangles_to_array
+    from agent.utils.artifacts import artifact_path, save_artifact
+    from agent.utils.distance_cache import DistanceCache
+    from agent.utils.schemas import LocationsInput, PackingInput, validation_message
+
+# Stops listed in the route summary kept in the state and sent to the LLM
+MAX_LISTED_STOPS = 20
+# Distances and durations already fetched from Google Maps, shared with batch runs
+DISTANCE_CACHE = DistanceCache()
+# Departure slots fetched for time-dependent routing (current slot and the next ones)
+TRAVEL_TIME_SLOTS = 2
+# Processes used to solve the clusters of large requests inside the app
+DECOMPOSE_WORKERS = 1
+
 @tool("tsp_solver")
 def tsp_solver(reasoning: str,
-               tool_call_id: Annotated[str, InjectedToolCallId]) -> Command:
+               tool_call_id: Annotated[str, InjectedToolCallId],
+               locations: Optional[List[Tuple[float, float]]] = None) -> Command:
     """
     Traveling Salesperson Problem (TSP) Solver Tool.
 
@@ -24,6 +45,9 @@ def tsp_solver(reasoning: str,
     
     tool_call_id : str
         The injected ID for the current tool call, used for tracking and state updates.
+    locations : list of (lat, lon), optional
+        Origin followed by the locations to visit. When omitted the user
+        is asked for them.
 
     Returns
     -------
@@ -32,29 +56,66 @@ def tsp_solver(reasoning: str,
     """
 
     # Ask user for missing inputs 
-    locations = interrupt(value = f"""{reasoning}\n\nI need these additional details:\n\n1.  The origin location\n2. The list of locations you want to visit\n""")
-
-    distance_matrix = get_distance_matrix(locations)
-    route = solve_tsp(distance_matrix)
-    tsp_map = show_tsp_route_on_map(locations, route)
-
-    now = datetime.now()
-    now_str = now.strftime("%Y_%m_%d_%H_%M_%S_%f")[:-3]
-
-    tsp_map_path = f"out/tsp_route_map_{now_str}.html"
+    if not locations:
+        locations = interrupt(value = f"""{reasoning}\n\nI need these additional details:\n\n1.  The origin location\n2. The list of locations you want to visit\n""")
+
+    # Validate and deduplicate before any distance lookup
+    try:
+        locations = LocationsInput.from_value(locations).coords
+    except ValueError as error:
+        return Command(update={"messages": [
+            ToolMessage(f"Invalid locations: {validation_message(error)}", tool_call_id=tool_call_id)
+        ]})
+
+    if len(locations) > DECOMPOSE_ABOVE:
+        # Too many stops for pairwise Directions calls: decompose on great circle distances, no map.
+        # Clusters are solved in-process to keep the app's process count bounded
+        route = solve_tsp(None, locations=locations, workers=DECOMPOSE_WORKERS)
+        travel_summary = (f"Large request: the route was optimised on straight-line (great-circle) "
+                          f"distances, not road distances or traffic; straight-line length "
+                          f"{route_distance(locations, route) / 1000:.1f} km\n")
+        tsp_map = None
+    else:
+        # Minimise travel time, using the traffic slot of each leg's expected departure
+        departure_time = datetime.now()
+        travel_times = get_travel_time_matrices(locations, departure_time,
+                                                num_slots=TRAVEL_TIME_SLOTS, cache=DISTANCE_CACHE)
+        route = solve_tsp(None, travel_times=travel_times, departure_time=departure_time)
+        if route is None:
+            return Command(update={"messages": [
+                ToolMessage("No route found between the given locations", tool_call_id=tool_call_id)
+            ]})
+        _, seconds, meters = simulate_route(travel_times, route, departure_time)
+        travel_summary = f"Estimated driving time: {seconds / 60:.0f} min ({meters / 1000:.1f} km)\n"
+        tsp_map = show_tsp_route_on_map(locations, route)
+
+    tsp_map_path = None
     if tsp_map:
+        tsp_map_path = artifact_path("tsp_route_map", "html")
         tsp_map.save(tsp_map_path)
-    optimal_route = "Visit order (coordinates):n"
-    for i, idx in enumerate(route):
-        optimal_route += f"- {i} Coordinate: {locations[idx]}\n"
-    optimal_route += "A Map with the TSP response has been generated too"
+
+    # Full route goes to an artifact file, state keeps a handle and a short summary
+    route_path = save_artifact("tsp_route",
+                               route=np.asarray(route, dtype=np.int32),
+                               locations=np.asarray(locations, dtype=np.float64))
+    optimal_route = "Visit order (coordinates):\n"
+    for i, idx in enumerate(route[:MAX_LISTED_STOPS]):
+        optimal_route += f"- {i} Coordinate: {tuple(locations[idx].tolist())}\n"
+    if len(route) > MAX_LISTED_STOPS:
+        optimal_route += f"- ... {len(route) - MAX_LISTED_STOPS} more stops\n"
+    optimal_route += travel_summary
+    solution = {"optimal_route":optimal_route,
+                "route_path":route_path,
+                "num_stops":len(locations)}
+    if tsp_map_path:
+        solution["optimal_route"] += "A Map with the TSP response has been generated too"
+        solution["tsp_map_path"] = tsp_map_path
     return Command(update={
-        "solution": {"optimal_route":optimal_route,
-                     "tsp_map_path":tsp_map_path},
+        "solution": solution,
         "messages": [
             ToolMessage({
-                         "optimal_route":optimal_route,
-                          "tsp_map_path":tsp_map_path
+                         "optimal_route":solution["optimal_route"],
+                          "route_path":route_path
                         }, 
                         tool_call_id=tool_call_id)
         ]
@@ -64,10 +125,10 @@ def tsp_solver(reasoning: str,
 
 @tool("bin_packing_solver")
 def bin_packing_solver(reasoning: str,
-                       pallet_dimensions: Tuple[int, int],   # (width, height)
-                        pallet_number: int,                   # cantidad de pallets
-                        container_dimensions: Tuple[int, int],# (width, height)
-                       tool_call_id: Annotated[str, InjectedToolCallId]) -> Command:
+                       tool_call_id: Annotated[str, InjectedToolCallId],
+                       pallets: Optional[List[Tuple[int, int, int]]] = None,  # (width, height, quantity)
+                       container: Optional[Tuple[int, int]] = None,          # (width, height)
+                       buffer: int = 0) -> Command:
     """
     Bin Packing Solver Tool.
 
@@ -77,14 +138,14 @@ def bin_packing_solver(reasoning: str,
     ----------
     reasoning : str
         Description of the packing problem.
-    pallet_dimensions : tuple(int, int)
-        Pallet size (width, height).
-    pallet_number : int
-        Number of pallets of this type.
-    container_dimensions : tuple(int, int)
-        Container size (width, height).
     tool_call_id : str
         Internal tracking ID for this tool call.
+    pallets : list of (int, int, int), optional
+        Pallet types as (width, height, quantity).
+    container : tuple(int, int), optional
+        Container size (width, height).
+    buffer : int
+        Extra space added to each pallet side.
 
     Returns
     -------
@@ -93,24 +154,26 @@ def bin_packing_solver(reasoning: str,
     """
 
     # Ask user for required details if missing
-    packing_request = interrupt(value=f"""{reasoning}\n\nI need these details:\n
+    if not pallets or not container:
+        packing_request = interrupt(value=f"""{reasoning}\n\nI need these details:\n
 1. Pallet dimensions and quantities (example: 10 pallets 80x120, 5 pallets 100x120)\n
 2. Container size (example: 235x590 for a 20' container)\n""")
+    else:
+        packing_request = {"pallets": pallets, "container": container, "buffer": buffer}
 
-    # Example structure expected:
-    # packing_request = {
-    #   "pallets": [(create_pallet(80,120,5), 10), (create_pallet(100,120,5), 5)],
-    #   "container": create_container(235,590)
-    # }
-
-    pallets = packing_request["pallets"]
-    container = packing_request["container"]
+    # Validate and collapse identical pallet types before packing
+    try:
+        packing_input = PackingInput.from_value(packing_request)
+    except ValueError as error:
+        return Command(update={"messages": [
+            ToolMessage(f"Invalid packing request: {validation_message(error)}", tool_call_id=tool_call_id)
+        ]})
+    pallets, container = packing_input.to_solver_args()
 
-    all_rects, all_pals, summary = solver(pallets, container)
+    all_rects, all_pals, summary = solve_bin_packing(pallets, container)
 
-    # Prepare response
-    now = datetime.now()
-    now_str = now.strftime("%Y_%m_%d_%H_%M_%S_%f")[:-3]
+    # Prepare response: rectangles go to an artifact file, state keeps a handle and the summary
+    rectangles_path = save_artifact("packing", rectangles=rectangles_to_array(all_rects))
 
     packing_result = "\n".join(summary)
     packing_result += "\nA bin packing solution has been computed."
@@ -118,12 +181,13 @@ def bin_packing_solver(reasoning: str,
     return Command(update={
         "solution": {
             "packing_summary": packing_result,
-            "rectangles": all_rects
+            "rectangles_path": rectangles_path,
+            "num_rectangles": len(all_rects)
         },
         "messages": [
             ToolMessage({
                 "packing_summary": packing_result,
-                "rectangles": str(all_rects)
+                "rectangles_path": rectangles_path
             }, tool_call_id=tool_call_id)
         ]
     })
\ No newline at end of file
@@ -0,0 +1,92 @@
+import tempfile
+from datetime import datetime, timedelta
+import numpy as np
+
+# Departure times are bucketed into slots of this many minutes
+SLOT_MINUTES = 60
+# Matrices larger than this (bytes, distances + durations over all slots) are
+# memory-mapped to temporary files. The app and batch.py decompose routes above
+# tsp_helper.DECOMPOSE_ABOVE stops (~320 KB per slot), so only direct callers of
+# get_travel_time_matrices with large inputs reach it
+MEMMAP_ABOVE_BYTES = 64 * 1024 * 1024
+# Marks pairs without a route (meters / seconds are stored as uint32)
+UNREACHABLE = np.iinfo(np.uint32).max
+
+
+# -------------------------------
+# Departure time slots
+# -------------------------------
+def slot_start(departure_time, slot_minutes=SLOT_MINUTES):
+    """Returns the start of the slot containing departure_time."""
+    minutes = departure_time.hour * 60 + departure_time.minute
+    start = departure_time.replace(hour=0, minute=0, second=0, microsecond=0)
+    return start + timedelta(minutes=minutes - minutes % slot_minutes)
+
+
+def slot_key(departure_time, slot_minutes=SLOT_MINUTES):
+    """
+    Returns the cache key of departure_time's slot: minutes from Monday
+    00:00 to the slot start.
+
+    Traffic repeats weekly, so Monday 08:00 of any week shares its key.
+    The key is independent of slot_minutes: slots of any length starting
+    at the same time are requested with the same departure time.
+    """
+    start = slot_start(departure_time, slot_minutes)
+    return start.weekday() * 24 * 60 + start.hour * 60 + start.minute
+
+
+def request_time(start, now=None):
+    """
+    Departure time sent to the provider for a slot.
+
+    Providers reject past departure times, so slots already started are
+    requested for the same time one week later.
+    """
+    now = now or datetime.now()
+    while start < now:
+        start += timedelta(days=7)
+    return start
+
+
+# -------------------------------
+# Per-slot matrices
+# -------------------------------
+class TravelTimeMatrices:
+    """
+    Distance (meters) and duration (seconds) matrices, one per departure slot.
+
+    Both are stored as (slots, n, n) uint32 arrays; above MEMMAP_ABOVE_BYTES
+    together they are memory-mapped to anonymous temporary files instead of
+    RAM, which the OS removes once the arrays are released. The app and
+    batch.py never build matrices that large (they decompose big routes on
+    great-circle distances), so this applies to direct callers only. Pairs
+    without a route hold UNREACHABLE.
+    """
+
+    def __init__(self, n, departure_time, num_slots=1, slot_minutes=SLOT_MINUTES):
+        self.n = n
+        self.slot_minutes = slot_minutes
+        first = slot_start(departure_time, slot_minutes)
+        self.slot_starts = [first + timedelta(minutes=slot_minutes * s) for s in range(num_slots)]
+
+        shape = (num_slots, n, n)
+        if 2 * num_slots * n * n * np.dtype(np.uint32).itemsize > MEMMAP_ABOVE_BYTES:
+            self.distances = np.memmap(tempfile.TemporaryFile(), mode="w+", dtype=np.uint32, shape=shape)
+            self.durations = np.memmap(tempfile.TemporaryFile(), mode="w+", dtype=np.uint32, shape=shape)
+        else:
+            self.distances = np.zeros(shape, dtype=np.uint32)
+            self.durations = np.zeros(shape, dtype=np.uint32)
+
+    @property
+    def num_slots(self):
+        return len(self.slot_starts)
+
+    def slot_index(self, departure_time):
+        """Index of the slot for departure_time, clamped to the fetched slots."""
+        elapsed = (departure_time - self.slot_starts[0]).total_seconds()
+        index = int(elapsed // (self.slot_minutes * 60))
+        return min(max(index, 0), self.num_slots - 1)
+
+    def slot_keys(self):
+        return [slot_key(start, self.slot_minutes) for start in self.slot_starts]
@@ -0,0 +1,249 @@
+import os
+import math
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+try:
+    from utils.tsp_helper import solve_tsp, haversine_distances, get_haversine_matrix
+except:
+    from agent.utils.tsp_helper import solve_tsp, haversine_distances, get_haversine_matrix
+
+# Target number of stops per cluster, small enough for OR-Tools to stay fast
+CLUSTER_SIZE = 120
+KMEANS_ITERATIONS = 15
+# Tour positions on each side of a seam revisited by the improvement pass
+SEAM_WINDOW = 30
+MAX_IMPROVEMENT_PASSES = 50
+# Longest segment moved by Or-opt
+OR_OPT_MAX_SEGMENT = 3
+
+
+# -------------------------------
+# Clustering
+# -------------------------------
+def _project(coords):
+    """Equirectangular projection to meters, good enough for clustering."""
+    lat0 = np.radians(coords[:, 0].mean())
+    x = np.radians(coords[:, 1]) * math.cos(lat0)
+    y = np.radians(coords[:, 0])
+    return np.column_stack([x, y]) * 6_371_000
+
+
+def kmeans(points, k, iterations=KMEANS_ITERATIONS, seed=0):
+    """
+    Lloyd's k-means on projected points.
+
+    Returns:
+        np.ndarray: Cluster label of every point; empty clusters are dropped
+        and labels renumbered from 0.
+    """
+    rng = np.random.default_rng(seed)
+    centroids = points[rng.choice(len(points), size=k, replace=False)]
+    point_norms = (points ** 2).sum(axis=1)[:, None]
+    for _ in range(iterations):
+        distances = point_norms - 2 * points @ centroids.T + (centroids ** 2).sum(axis=1)
+        labels = distances.argmin(axis=1)
+        counts = np.bincount(labels, minlength=k)
+        for axis in range(points.shape[1]):
+            sums = np.bincount(labels, weights=points[:, axis], minlength=k)
+            centroids[:, axis] = np.where(counts > 0, sums / np.maximum(counts, 1),
+                                          centroids[:, axis])
+    _, labels = np.unique(labels, return_inverse=True)
+    return labels
+
+
+# -------------------------------
+# Cluster sub-problems
+# -------------------------------
+def _solve_cluster_path(coords, start, end):
+    """Visit order of one cluster, as an open path from start to end (local indexes)."""
+    if len(coords) == 1:
+        return [0]
+    if len(coords) == 2:
+        return [start, end]
+    route = solve_tsp(get_haversine_matrix(coords), start=start, end=end, decompose=False)
+    return route
+
+
+def _closest_pair(coords_a, coords_b, exclude_a=None):
+    """Indexes (i, j) of the closest points between two clusters."""
+    distances = haversine_distances(coords_a, coords_b)
+    if exclude_a is not None and len(coords_a) > 1:
+        distances[exclude_a, :] = np.inf
+    i, j = np.unravel_index(distances.argmin(), distances.shape)
+    return int(i), int(j)
+
+
+def _entries_and_exits(coords, members, order):
+    """
+    Chooses where the tour enters and leaves every cluster.
+
+    Consecutive clusters are joined through their closest pair of stops.
+    The depot cluster is entered at the depot and the last cluster is left
+    at the stop closest to the depot.
+    """
+    entries = {order[0]: int(np.flatnonzero(members[order[0]] == 0)[0])}
+    exits = {}
+    for a, b in zip(order, order[1:]):
+        i, j = _closest_pair(coords[members[a]], coords[members[b]], exclude_a=entries[a])
+        exits[a], entries[b] = i, j
+
+    last = order[-1]
+    to_depot = haversine_distances(coords[members[last]], coords[:1])[:, 0]
+    if len(members[last]) > 1:
+        to_depot[entries[last]] = np.inf
+    exits[last] = int(to_depot.argmin())
+    return entries, exits
+
+
+# -------------------------------
+# Seam improvement (2-opt / Or-opt)
+# -------------------------------
+def _two_opt(tour, coords, lo, hi):
+    """
+    Best-improvement 2-opt restricted to tour positions lo..hi.
+
+    Reverses tour[i..j] when it shortens the tour; returns True if any move
+    was applied.
+    """
+    positions = np.arange(lo - 1, hi + 2)
+    nodes = tour[positions]
+    d = haversine_distances(coords[nodes], coords[nodes])
+    improved = False
+    for _ in range(MAX_IMPROVEMENT_PASSES):
+        # i, j are offsets in nodes; reverse nodes[i..j] for 1 <= i < j <= len - 2
+        i, j = np.triu_indices(len(nodes) - 1, k=1)
+        keep = i >= 1
+        i, j = i[keep], j[keep]
+        delta = d[i - 1, j] + d[i, j + 1] - d[i - 1, i] - d[j, j + 1]
+        best = delta.argmin() if len(delta) else None
+        if best is None or delta[best] > -1e-6:
+            break
+        a, b = i[best], j[best]
+        order = np.arange(len(nodes))
+        order[a:b + 1] = order[a:b + 1][::-1]
+        nodes, d = nodes[order], d[np.ix_(order, order)]
+        improved = True
+    tour[positions] = nodes
+    return improved
+
+
+def _or_opt(tour, coords, lo, hi):
+    """
+    First-improvement Or-opt restricted to tour positions lo..hi.
+
+    Moves segments of up to OR_OPT_MAX_SEGMENT stops (optionally reversed)
+    to a cheaper place in the window; returns True if any move was applied.
+    """
+    positions = np.arange(lo - 1, hi + 2)
+    nodes = list(tour[positions])
+    index = {node: k for k, node in enumerate(nodes)}
+    d = haversine_distances(coords[nodes], coords[nodes]).tolist()
+
+    def cost(a, b):
+        return d[index[a]][index[b]]
+
+    improved = False
+    for _ in range(MAX_IMPROVEMENT_PASSES):
+        moved = False
+        for length in range(1, OR_OPT_MAX_SEGMENT + 1):
+            for s in range(1, len(nodes) - length):
+                prev, first, last, nxt = nodes[s - 1], nodes[s], nodes[s + length - 1], nodes[s + length]
+                removed = cost(prev, first) + cost(last, nxt) - cost(prev, nxt)
+                rest = nodes[:s] + nodes[s + length:]
+                segment = nodes[s:s + length]
+                for k in range(len(rest) - 1):
+                    a, b = rest[k], rest[k + 1]
+                    if k == s - 1:
+                        continue
+                    added = cost(a, first) + cost(last, b) - cost(a, b)
+                    added_reversed = cost(a, last) + cost(first, b) - cost(a, b)
+                    if min(added, added_reversed) < removed - 1e-6:
+                        if added_reversed < added:
+                            segment = segment[::-1]
+                        nodes = rest[:k + 1] + segment + rest[k + 1:]
+                        moved = improved = True
+                        break
+                if moved:
+                    break
+            if moved:
+                break
+        if not moved:
+            break
+    tour[positions] = nodes
+    return improved
+
+
+def improve_seams(tour, coords, seams, window=SEAM_WINDOW):
+    """
+    Runs 2-opt and Or-opt around every seam between two cluster paths.
+
+    Args:
+        tour (np.ndarray): Closed tour, modified in place. The depot at both
+            ends is never moved.
+        coords (np.ndarray): (n, 2) coordinates.
+        seams (list[int]): Tour positions where a new cluster path starts.
+        window (int): Positions revisited on each side of a seam.
+    """
+    for seam in seams:
+        lo = max(1, seam - window)
+        hi = min(len(tour) - 2, seam + window)
+        if hi - lo < 2:
+            continue
+        for _ in range(MAX_IMPROVEMENT_PASSES):
+            if not (_two_opt(tour, coords, lo, hi) | _or_opt(tour, coords, lo, hi)):
+                break
+
+
+# -------------------------------
+# Decomposition
+# -------------------------------
+def solve_tsp_decomposed(locations, cluster_size=CLUSTER_SIZE, workers=None):
+    """
+    Solves a large single vehicle tour by geographic decomposition.
+
+    Stops are split into k-means clusters, each cluster is solved as an
+    open path in parallel, clusters are visited in the order of a tour over
+    their centroids, and the stitched tour is improved with 2-opt/Or-opt
+    around the seams. Costs are great circle distances, so no network calls
+    are made.
+
+    Args:
+        locations (list of (lat, lon)): Coordinates; the first one is the depot.
+        cluster_size (int): Target stops per cluster.
+        workers (int, optional): Processes used for the clusters, defaults to
+            the CPU count.
+
+    Returns:
+        list[int]: Closed tour starting and ending at the depot (index 0).
+    """
+    coords = np.asarray(locations, dtype=np.float64)
+    n = len(coords)
+    if n <= cluster_size:
+        return solve_tsp(get_haversine_matrix(coords), decompose=False)
+
+    labels = kmeans(_project(coords), math.ceil(n / cluster_size))
+    members = [np.flatnonzero(labels == c) for c in range(labels.max() + 1)]
+
+    # Visit clusters in the order of a tour over their centroids, from the depot's
+    centroids = np.array([coords[m].mean(axis=0) for m in members])
+    depot_cluster = int(labels[0])
+    order = solve_tsp(get_haversine_matrix(centroids), start=depot_cluster, decompose=False)[:-1]
+
+    entries, exits = _entries_and_exits(coords, members, order)
+    tasks = [(coords[members[c]], entries[c], exits[c]) for c in order]
+    workers = workers or os.cpu_count() or 1
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            paths = list(executor.map(_solve_cluster_path, *zip(*tasks)))
+    else:
+        paths = [_solve_cluster_path(*task) for task in tasks]
+
+    tour, seams = [], []
+    for c, path in zip(order, paths):
+        seams.append(len(tour))
+        tour.extend(members[c][path].tolist())
+    tour.append(0)
+    tour = np.asarray(tour, dtype=np.int64)
+
+    improve_seams(tour, coords, seams[1:] + [len(tour) - 1])
+    return tour.tolist()
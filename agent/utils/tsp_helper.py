@@ -1,14 +1,35 @@
 import os
 import requests
+from functools import lru_cache
+import numpy as np
 import googlemaps
 import streamlit as st
 import folium
 from ortools.constraint_solver import pywrapcp, routing_enums_pb2
 from folium.plugins import AntPath, MarkerCluster
-from datetime import datetime
-
-GOOGLE_KEY = st.secrets.get("GOOGLE_KEY")
-GMAPS = googlemaps.Client(key=GOOGLE_KEY)
+from datetime import datetime, timedelta
+try:
+    from utils.distance_cache import location_key
+    from utils.travel_time import (TravelTimeMatrices, SLOT_MINUTES, UNREACHABLE,
+                                   request_time, slot_start)
+except:
+    from agent.utils.distance_cache import location_key
+    from agent.utils.travel_time import (TravelTimeMatrices, SLOT_MINUTES, UNREACHABLE,
+                                         request_time, slot_start)
+
+try:
+    GOOGLE_KEY = st.secrets.get("GOOGLE_KEY")
+except FileNotFoundError:  # no secrets.toml, e.g. headless batch runs
+    GOOGLE_KEY = os.environ.get("GOOGLE_KEY")
+GMAPS = googlemaps.Client(key=GOOGLE_KEY) if GOOGLE_KEY else None
+
+EARTH_RADIUS_M = 6_371_000
+# Above this number of stops solve_tsp switches to the clustering decomposition
+DECOMPOSE_ABOVE = 200
+# Origins/destinations per Distance Matrix request (API limit: 100 elements)
+MATRIX_BLOCK = 10
+# Re-solves of the time-dependent tour after updating leg departure slots
+TIME_DEPENDENT_ITERATIONS = 5
 
 # ------------------------
 # 1. Get distance matrix from Google Maps
@@ -36,53 +57,207 @@ GMAPS = googlemaps.Client(key=GOOGLE_KEY)
 #     return matrix
 
 
-def get_distance_matrix(locations):
+def get_travel_time_matrices(locations, departure_time=None, num_slots=1,
+                             slot_minutes=SLOT_MINUTES, cache=None):
     """
-    Builds a distance matrix using Google Maps Directions API.
-    
+    Builds per-slot distance and duration matrices with the Google Maps
+    Distance Matrix API.
+
+    Departure times are bucketed into slots of slot_minutes, so every
+    request in a slot uses the same departure time and can be cached.
+    Durations include traffic when the provider returns it.
+
     Args:
         locations (list of (lat, lon)): List of coordinates.
-    
+        departure_time (datetime, optional): Start of the trip, defaults to now.
+        num_slots (int): Consecutive slots to fetch from the departure slot on.
+        slot_minutes (int): Slot length in minutes.
+        cache (DistanceCache, optional): Known pairs are read from it and new
+            ones written back, so only missing pairs hit the API.
+
     Returns:
-        list[list[int]]: Distance matrix in meters.
+        TravelTimeMatrices: Distances in meters and durations in seconds.
     """
+    departure_time = departure_time or datetime.now()
     n = len(locations)
-    matrix = [[0] * n for _ in range(n)]
+    matrices = TravelTimeMatrices(n, departure_time, num_slots, slot_minutes)
+    keys = [location_key(location) for location in locations]
+    points = [(float(lat), float(lon)) for lat, lon in locations]
     now = datetime.now()
 
-    for i in range(n):
-        for j in range(n):
-            if i == j:
-                matrix[i][j] = 0
-            else:
-                origin = f"{locations[i][0]},{locations[i][1]}"
-                destination = f"{locations[j][0]},{locations[j][1]}"
-
-                directions_result = GMAPS.directions(
-                    origin=origin,
-                    destination=destination,
+    for s, (start, key) in enumerate(zip(matrices.slot_starts, matrices.slot_keys())):
+        cached = cache.get_many(keys, key) if cache is not None else {}
+        fetched = {}
+        when = request_time(start, now)
+
+        for o in range(0, n, MATRIX_BLOCK):
+            origins = range(o, min(o + MATRIX_BLOCK, n))
+            for d in range(0, n, MATRIX_BLOCK):
+                destinations = range(d, min(d + MATRIX_BLOCK, n))
+                if all(i == j or (keys[i], keys[j]) in cached
+                       for i in origins for j in destinations):
+                    continue
+                result = GMAPS.distance_matrix(
+                    origins=[points[i] for i in origins],
+                    destinations=[points[j] for j in destinations],
                     mode="driving",
-                    departure_time=now
+                    departure_time=when
                 )
-                if directions_result:
-                    leg = directions_result[0]['legs'][0]
-                    matrix[i][j] = leg['distance']['value']  # meters
-                else:
-                    matrix[i][j] = float("inf")  # fallback if no route
-    return matrix
+                for row, i in zip(result["rows"], origins):
+                    for element, j in zip(row["elements"], destinations):
+                        if i != j:
+                            fetched[(keys[i], keys[j])] = _element_values(element)
+
+        values = {**cached, **fetched}
+        for i in range(n):
+            for j in range(n):
+                if i != j:
+                    distance, duration = values[(keys[i], keys[j])]
+                    matrices.distances[s, i, j] = distance
+                    matrices.durations[s, i, j] = duration
+
+        if cache is not None and fetched:
+            cache.set_many(fetched, key)
+    return matrices
+
+
+def _element_values(element):
+    """(meters, seconds) of a Distance Matrix element, UNREACHABLE if no route."""
+    if element.get("status") != "OK":
+        return UNREACHABLE, UNREACHABLE
+    duration = element.get("duration_in_traffic", element["duration"])
+    return element["distance"]["value"], duration["value"]
+
+
+def get_distance_matrix(locations, cache=None):
+    """
+    Builds a distance matrix for the current departure slot.
+    
+    Args:
+        locations (list of (lat, lon)): List of coordinates.
+        cache (DistanceCache, optional): Shared travel time cache.
+    
+    Returns:
+        list[list[int]]: Distance matrix in meters.
+    """
+    matrices = get_travel_time_matrices(locations, cache=cache)
+    matrix = matrices.distances[0].astype(np.int64).tolist()
+    return [[float("inf") if value == UNREACHABLE else value for value in row]  # fallback if no route
+            for row in matrix]
+
+
+def haversine_distances(origins, destinations):
+    """
+    Great circle distances between every origin and every destination.
+    
+    Args:
+        origins (array (n, 2)): (lat, lon) coordinates.
+        destinations (array (m, 2)): (lat, lon) coordinates.
+    
+    Returns:
+        np.ndarray: (n, m) float64 distances in meters.
+    """
+    a = np.radians(np.asarray(origins, dtype=np.float64))
+    b = np.radians(np.asarray(destinations, dtype=np.float64))
+    lat1, lon1 = a[:, 0:1], a[:, 1:2]
+    lat2, lon2 = b[:, 0], b[:, 1]
+    h = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(h, 0, 1)))
+
+
+def route_distance(locations, route):
+    """
+    Great circle length of a route in meters, without building a matrix.
+    
+    Args:
+        locations (list of (lat, lon)): List of coordinates.
+        route (list[int]): Visit order.
+    
+    Returns:
+        float: Route length in meters.
+    """
+    coords = np.radians(np.asarray(locations, dtype=np.float64)[np.asarray(route)])
+    a, b = coords[:-1], coords[1:]
+    h = (np.sin((b[:, 0] - a[:, 0]) / 2) ** 2
+         + np.cos(a[:, 0]) * np.cos(b[:, 0]) * np.sin((b[:, 1] - a[:, 1]) / 2) ** 2)
+    return float((2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(h, 0, 1)))).sum())
+
+
+def get_haversine_matrix(locations):
+    """
+    Builds a straight-line (great circle) distance matrix, no network needed.
+    
+    Args:
+        locations (list of (lat, lon)): List of coordinates.
+    
+    Returns:
+        list[list[int]]: Distance matrix in meters.
+    """
+    matrix = haversine_distances(locations, locations)
+    return matrix.round().astype(np.int64).tolist()
 
 # ------------------------
 # 2. Solve TSP with OR-Tools
 # ------------------------
-def solve_tsp(distance_matrix):
+def solve_tsp(distance_matrix, start=0, end=None, locations=None, decompose=None,
+              travel_times=None, departure_time=None, workers=None):
+    """
+    Solves a single vehicle tour (or open path) with OR-Tools.
+
+    Args:
+        distance_matrix (list[list[int]] | None): Costs between stops. Must
+            be None when the problem is decomposed.
+        start (int): Index of the first stop.
+        end (int, optional): Index of the last stop. Defaults to start,
+            i.e. a closed tour.
+        locations (list of (lat, lon), optional): Coordinates, required to
+            decompose large problems.
+        decompose (bool, optional): Use the clustering decomposition
+            (tsp_decomposition.solve_tsp_decomposed), which uses great circle
+            distances and a closed tour from location 0. By default it is
+            used when only locations are given and there are more than
+            DECOMPOSE_ABOVE stops.
+        travel_times (TravelTimeMatrices, optional): Minimise travel time
+            using the slot of each leg's expected departure instead of
+            distance_matrix (see solve_tsp_time_dependent).
+        departure_time (datetime, optional): Start of the trip for
+            travel_times, defaults to now.
+        workers (int, optional): Processes used by the decomposition,
+            defaults to the CPU count.
+
+    Returns:
+        list[int] | None: Visit order, starting at start and ending at end.
+    """
+    if travel_times is not None:
+        return solve_tsp_time_dependent(travel_times, departure_time, start)
+    if decompose is None:
+        decompose = (distance_matrix is None and locations is not None
+                     and len(locations) > DECOMPOSE_ABOVE)
+    if decompose:
+        if locations is None:
+            raise ValueError("decompose needs locations")
+        if distance_matrix is not None or start != 0 or end is not None:
+            raise ValueError("decompose builds its own great circle costs for a closed tour "
+                             "from location 0; distance_matrix, start and end are not supported")
+        try:
+            from utils.tsp_decomposition import solve_tsp_decomposed
+        except:
+            from agent.utils.tsp_decomposition import solve_tsp_decomposed
+        return solve_tsp_decomposed(locations, workers=workers)
+
     data = {
         'distance_matrix': distance_matrix,
         'num_vehicles': 1,
-        'depot': 0
+        'depot': start
     }
 
-    manager = pywrapcp.RoutingIndexManager(len(distance_matrix),
-                                           data['num_vehicles'], data['depot'])
+    if end is None or end == start:
+        manager = pywrapcp.RoutingIndexManager(len(distance_matrix),
+                                               data['num_vehicles'], data['depot'])
+    else:
+        manager = pywrapcp.RoutingIndexManager(len(distance_matrix),
+                                               data['num_vehicles'], [start], [end])
     routing = pywrapcp.RoutingModel(manager)
 
     def distance_callback(from_index, to_index):
@@ -90,7 +265,11 @@ def solve_tsp(distance_matrix):
         to_node = manager.IndexToNode(to_index)
         return data['distance_matrix'][from_node][to_node]
 
-    transit_callback_index = routing.RegisterTransitCallback(distance_callback)
+    # Integer matrices are registered natively, so the solver does not call back into Python per arc
+    if all(isinstance(value, int) for row in distance_matrix for value in row):
+        transit_callback_index = routing.RegisterTransitMatrix(distance_matrix)
+    else:
+        transit_callback_index = routing.RegisterTransitCallback(distance_callback)
     routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
 
     search_parameters = pywrapcp.DefaultRoutingSearchParameters()
@@ -111,19 +290,87 @@ def solve_tsp(distance_matrix):
         return None
 
 
-def get_directions(start, end):
+def simulate_route(travel_times, route, departure_time):
+    """
+    Drives a route through the per-slot matrices.
+
+    Args:
+        travel_times (TravelTimeMatrices): Per-slot matrices.
+        route (list[int]): Visit order.
+        departure_time (datetime): Start of the trip.
+
+    Returns:
+        tuple[np.ndarray, int, int]: Departure slot index of every stop left,
+        total seconds and total meters.
+    """
+    slots = np.full(travel_times.n, travel_times.slot_index(departure_time))
+    elapsed, meters = 0, 0
+    for a, b in zip(route, route[1:]):
+        slot = travel_times.slot_index(departure_time + timedelta(seconds=elapsed))
+        slots[a] = slot
+        elapsed += int(travel_times.durations[slot, a, b])
+        meters += int(travel_times.distances[slot, a, b])
+    return slots, elapsed, meters
+
+
+def solve_tsp_time_dependent(travel_times, departure_time=None, start=0,
+                             max_iterations=TIME_DEPENDENT_ITERATIONS):
+    """
+    Solves a tour minimising travel time with time-dependent durations.
+
+    The tour is first solved with the departure slot durations. The route
+    is then driven to find when each stop is left, every row of the cost
+    matrix is taken from that stop's departure slot, and the tour is solved
+    again until the route or the slots stop changing.
+
+    Args:
+        travel_times (TravelTimeMatrices): Per-slot matrices.
+        departure_time (datetime, optional): Start of the trip, defaults to now.
+        start (int): Index of the depot.
+        max_iterations (int): Maximum number of solves.
+
+    Returns:
+        list[int] | None: Closed tour starting and ending at start.
+    """
+    departure_time = departure_time or datetime.now()
+    nodes = np.arange(travel_times.n)
+    slots = np.full(travel_times.n, travel_times.slot_index(departure_time))
+    route = None
+    for _ in range(max_iterations):
+        costs = travel_times.durations[slots, nodes].astype(np.int64)
+        new_route = solve_tsp(costs.tolist(), start=start, decompose=False)
+        if new_route is None or new_route == route:
+            break
+        route = new_route
+        new_slots, _, _ = simulate_route(travel_times, route, departure_time)
+        if (new_slots == slots).all():
+            break
+        slots = new_slots
+    return route
+
+
+def get_directions(start, end, departure_time=None):
     """
     Retrieves directions from the Google Maps Directions API.
 
+    The departure time is bucketed into its slot like the travel time
+    matrices, so repeated legs in the same slot are served from cache.
+
     Args:
         start (str): The starting location for the route.
         end (str): The ending location for the route.
+        departure_time (datetime, optional): Defaults to now.
 
     Returns:
         list: A list of directions results.
     """
-    directions_result = GMAPS.directions(start, end, mode="driving", departure_time="now")
-    return directions_result
+    departure = request_time(slot_start(departure_time or datetime.now()))
+    return _cached_directions(start, end, departure)
+
+
+@lru_cache(maxsize=4096)
+def _cached_directions(start, end, departure):
+    return GMAPS.directions(start, end, mode="driving", departure_time=departure)
 
 def extract_info(directions_result):
     """
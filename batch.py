@@ -0,0 +1,228 @@
+"""
+Headless batch runner: solves many routing and packing jobs without the LLM.
+
+Jobs are read from a JSONL or CSV file, one job per line/row. A job is either
+
+- {"job_id": "r1", "type": "tsp", "locations": [[19.43, -99.13], ...]}
+- {"job_id": "p1", "type": "packing", "pallets": [[80, 120, 10]],
+   "container": [235, 590], "buffer": 5}
+- {"job_id": "x1", "text": "10 pallets 80x120 into 235x590"}
+
+Free text (the "text" or "body" field) goes through the same parsers as the
+assistant's pre-router. In CSV files the list fields are JSON strings.
+
+Usage:
+    python batch.py jobs.jsonl --out out/batch --workers 4 --distance haversine
+    python batch.py jobs.jsonl --distance google --departure 2025-01-31T08:00 --slots 3
+"""
+import os
+import re
+import csv
+import sys
+import json
+import time
+import argparse
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from agent.utils.router_helper import route_request
+from agent.utils.schemas import LocationsInput, PackingInput, validation_message
+from agent.utils.bin_packing_helper import solve_bin_packing, rectangles_to_array
+from agent.utils import tsp_helper
+from agent.utils.tsp_helper import (get_travel_time_matrices, get_haversine_matrix, route_distance,
+                                    simulate_route, solve_tsp, DECOMPOSE_ABOVE)
+from agent.utils.tsp_decomposition import solve_tsp_decomposed
+from agent.utils.distance_cache import DistanceCache, DEFAULT_CACHE_PATH
+from agent.utils.artifacts import save_artifact
+
+# Job fields holding lists, JSON encoded in CSV files
+LIST_FIELDS = ("locations", "pallets", "container")
+TOOL_TYPES = {"tsp_solver": "tsp", "bin_packing_solver": "packing"}
+# Characters kept when a job id is used in a file name
+UNSAFE_NAME_CHARS = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+# -------------------------------
+# Job loading
+# -------------------------------
+def read_jobs(path):
+    """Reads jobs from a .jsonl or .csv file."""
+    if path.endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            jobs = []
+            for row in csv.DictReader(f):
+                row = {k: v for k, v in row.items() if v not in (None, "")}
+                for field in LIST_FIELDS:
+                    if field in row:
+                        row[field] = json.loads(row[field])
+                jobs.append(row)
+    else:
+        with open(path, encoding="utf-8") as f:
+            jobs = [json.loads(line) for line in f if line.strip()]
+
+    for i, job in enumerate(jobs):
+        job.setdefault("job_id", job.get("request_id", str(i)))
+    return jobs
+
+
+def normalize_job(job):
+    """Fills "type" and the solver fields of free text jobs."""
+    if "type" in job:
+        return job
+    routed = route_request(job.get("text") or job.get("body"), strict=False)
+    if routed is None:
+        raise ValueError("could not identify a TSP or packing problem")
+    tool_name, args = routed
+    args.pop("reasoning")
+    return {**job, **args, "type": TOOL_TYPES[tool_name]}
+
+
+def safe_name(job_id):
+    """Returns job_id reduced to characters that are safe in a file name."""
+    return UNSAFE_NAME_CHARS.sub("_", str(job_id)).strip(".") or "job"
+
+
+# -------------------------------
+# Solvers
+# -------------------------------
+def solve_tsp_job(job, options):
+    locations = LocationsInput.from_value(job["locations"]).coords
+    result = {}
+    if len(locations) > DECOMPOSE_ABOVE:
+        # Clustering decomposition on great circle distances
+        route = solve_tsp_decomposed(locations, workers=options["cluster_workers"])
+        total = route_distance(locations, route)
+    elif options["distance"] == "google":
+        # Time-dependent travel times, bucketed by departure slot
+        departure_time = options["departure_time"] or datetime.now()
+        travel_times = get_travel_time_matrices(locations, departure_time,
+                                                num_slots=options["slots"], cache=options["cache"])
+        route = solve_tsp(None, travel_times=travel_times, departure_time=departure_time)
+        if route is None:
+            raise ValueError("no route found")
+        _, seconds, total = simulate_route(travel_times, route, departure_time)
+        result["total_duration_s"] = seconds
+    else:
+        distance_matrix = get_haversine_matrix(locations)
+        route = solve_tsp(distance_matrix)
+        if route is None:
+            raise ValueError("no route found")
+        total = sum(distance_matrix[a][b] for a, b in zip(route, route[1:]))
+    path = save_artifact(f"tsp_route_{safe_name(job['job_id'])}", folder=options["out"],
+                         route=np.asarray(route, dtype=np.int32),
+                         locations=locations)
+    result.update({"num_stops": len(locations), "total_distance_m": int(total), "artifact_path": path})
+    return result
+
+
+def solve_packing_job(job, options):
+    packing_input = PackingInput.from_value(
+        {k: job[k] for k in ("pallets", "container", "buffer") if k in job})
+    pallets, container = packing_input.to_solver_args()
+
+    all_rects, _, summary = solve_bin_packing(pallets, container)
+    path = save_artifact(f"packing_{safe_name(job['job_id'])}", folder=options["out"],
+                         rectangles=rectangles_to_array(all_rects))
+    return {"packed": len(all_rects), "requested": packing_input.total_pallets,
+            "summary": summary, "artifact_path": path}
+
+
+SOLVERS = {"tsp": solve_tsp_job, "packing": solve_packing_job}
+
+
+def run_job(job, options):
+    """Solves a single job; errors are reported in the result, never raised."""
+    start = time.perf_counter()
+    result = {"job_id": job["job_id"]}
+    try:
+        job = normalize_job(job)
+        result["type"] = job["type"]
+        if job["type"] not in SOLVERS:
+            raise ValueError(f"unknown job type {job['type']!r}, "
+                             f"expected one of: {', '.join(SOLVERS)}")
+        result.update(SOLVERS[job["type"]](job, options))
+        result["status"] = "ok"
+    except ValueError as error:
+        result["status"] = "error"
+        result["error"] = validation_message(error)
+    except KeyError as error:
+        result["status"] = "error"
+        result["error"] = f"missing field {error}"
+    except Exception as error:  # provider, file system... one job must not stop the batch
+        result["status"] = "error"
+        result["error"] = f"{type(error).__name__}: {error}"
+    result["seconds"] = round(time.perf_counter() - start, 4)
+    return result
+
+
+# -------------------------------
+# Entry point
+# -------------------------------
+def run_batch(jobs, out, workers=None, distance="haversine", cache_path=DEFAULT_CACHE_PATH,
+              departure_time=None, slots=1):
+    """
+    Solves jobs on a process pool.
+
+    Args:
+        jobs (list[dict]): Jobs as returned by read_jobs.
+        out (str): Output folder for artifacts.
+        workers (int, optional): Number of processes, defaults to the CPU count.
+        distance (str): "haversine" (offline) or "google" (Directions API).
+        cache_path (str): Distance cache shared by all workers.
+        departure_time (datetime, optional): Trip start for "google" jobs,
+            defaults to the time each job runs.
+        slots (int): Departure slots fetched for "google" jobs.
+
+    Returns:
+        list[dict]: One result per job, in input order.
+    """
+    workers = workers or os.cpu_count() or 1
+    # Jobs already run in parallel, so large tours solve their clusters in-process
+    options = {"out": out, "distance": distance, "cache": DistanceCache(cache_path),
+               "departure_time": departure_time, "slots": slots,
+               "cluster_workers": 1 if workers > 1 else None}
+    if workers == 1:
+        return [run_job(job, options) for job in jobs]
+
+    chunksize = max(1, len(jobs) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(run_job, jobs, [options] * len(jobs), chunksize=chunksize))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Solve routing and packing jobs without the LLM.")
+    parser.add_argument("jobs", help="Jobs file (.jsonl or .csv)")
+    parser.add_argument("--out", default="out/batch", help="Output folder")
+    parser.add_argument("--workers", type=int, default=None, help="Number of processes")
+    parser.add_argument("--distance", choices=["haversine", "google"], default="haversine",
+                        help="Distance source for TSP jobs")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH, help="Shared distance cache file")
+    parser.add_argument("--departure", type=datetime.fromisoformat, default=None,
+                        help="Trip start for google distances, e.g. 2025-01-31T08:00")
+    parser.add_argument("--slots", type=int, default=1,
+                        help="Departure slots fetched for google distances")
+    args = parser.parse_args()
+
+    if args.distance == "google" and tsp_helper.GMAPS is None:
+        sys.exit("--distance google needs a GOOGLE_KEY (secrets.toml or environment variable)")
+
+    os.makedirs(args.out, exist_ok=True)
+    jobs = read_jobs(args.jobs)
+
+    start = time.perf_counter()
+    results = run_batch(jobs, args.out, args.workers, args.distance, args.cache,
+                        args.departure, args.slots)
+    elapsed = time.perf_counter() - start
+
+    results_path = os.path.join(args.out, "results.jsonl")
+    with open(results_path, "w", encoding="utf-8") as f:
+        f.write("".join(json.dumps(result) + "\n" for result in results))
+
+    failed = sum(result["status"] != "ok" for result in results)
+    print(f"{len(results)} jobs ({failed} failed) in {elapsed:.2f}s "
+          f"-> {len(results) / elapsed:.2f} jobs/s")
+    print(f"Results written to {results_path}")
+
+
+if __name__ == "__main__":
+    main()